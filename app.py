@@ -1,9 +1,18 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+import gzip
+import hashlib
+import heapq
 import json
+import math
+import mimetypes
+import mmap
 import os
 import random
+import struct
+import tempfile
+import click
 from flask_sqlalchemy import SQLAlchemy
-from datetime import date
+from datetime import date, datetime
 
 app = Flask(__name__)
 
@@ -37,6 +46,13 @@ class Fact(db.Model):
     tags = db.Column(db.Text, default='')  # Comma-separated tags
     image_url = db.Column(db.Text, nullable=True)  # For image support
 
+    __table_args__ = (
+        # Per-deck due cursors and the cross-deck due queue
+        db.Index('ix_fact_deck_next_review', 'deck_id', 'next_review_date'),
+        db.Index('ix_fact_next_review', 'next_review_date'),
+        db.Index('ix_fact_deck_last_reviewed', 'deck_id', 'last_reviewed'),
+    )
+
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     total_facts_viewed = db.Column(db.Integer, default=0)
@@ -58,21 +74,241 @@ class Achievement(db.Model):
 
 class StudySession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    mode = db.Column(db.String(50), nullable=False)  # 'review', 'cram', 'random', 'spaced'
+    mode = db.Column(db.String(50), nullable=False)  # 'review', 'cram', 'random', 'spaced', 'all_decks'
     deck_id = db.Column(db.Integer, db.ForeignKey('deck.id'), nullable=False)
     start_time = db.Column(db.DateTime, default=db.func.current_timestamp())
     end_time = db.Column(db.DateTime, nullable=True)
     facts_studied = db.Column(db.Integer, default=0)
     correct_answers = db.Column(db.Integer, default=0)
     total_time = db.Column(db.Integer, default=0)  # Time in seconds
+    # Custom session plan
+    fact_limit = db.Column(db.Integer, nullable=True)
+    time_limit = db.Column(db.Integer, nullable=True)  # Time in minutes
+    planned_count = db.Column(db.Integer, nullable=True)  # Facts in the plan; None when unplanned
+    plan_position = db.Column(db.Integer, default=0)  # Next index into the plan
+
+class SessionPlanChunk(db.Model):
+    """A fixed-size slice of a custom session's planned fact ids"""
+    session_id = db.Column(db.Integer, db.ForeignKey('study_session.id'), primary_key=True)
+    chunk = db.Column(db.Integer, primary_key=True)  # plan_position // PLAN_CHUNK_SIZE
+    fact_ids = db.Column(db.LargeBinary, nullable=False)  # Packed PLANNED_FACT_ID values
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DECKS_DIR = os.path.join(BASE_DIR, 'decks')
+
+# Compiled deck packs: header, deck name, offset index, then UTF-8 fact content.
+# Header fields: magic, version, name length, fact count, content length.
+DECK_PACK_MAGIC = b'FFDP'
+DECK_PACK_VERSION = 1
+DECK_PACK_EXT = '.ffpack'
+DECK_PACK_HEADER = struct.Struct('<4sHHIQ')
+
+# Fingerprinted static assets written by `flask build-assets`
+ASSET_DIST_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MANIFEST_PATH = os.path.join(ASSET_DIST_DIR, 'manifest.json')
+ASSET_EXTENSIONS = ('.css', '.js')
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESS_MIN_SIZE = 1024  # Bytes; smaller JSON bodies are sent as-is
+
+STUDY_MODES = ['spaced', 'review', 'cram', 'random']
+ALL_DECKS_SESSION_MODE = 'all_decks'  # StudySession.mode for cross-deck sessions
+PLANNED_FACT_ID = struct.Struct('<I')
+PLAN_CHUNK_SIZE = 1024  # Fact ids per SessionPlanChunk row (4 KB)
 
 current_deck_id = None
 viewed = set()
 shuffle_mode = False
 current_study_mode = 'spaced'  # 'spaced', 'review', 'cram', 'random'
-current_session = None
+current_session_id = None  # Active StudySession row; loaded per request
+all_decks_mode = False  # Study due facts across every deck
+deck_weights = {}  # deck_id -> priority weight for all-decks mode
+deck_daily_caps = {}  # deck_id -> max facts reviewed per day in all-decks mode
+
+class DeckPack:
+    """Read-only, memory-mapped view of a compiled deck pack"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, name_len, count, content_len = DECK_PACK_HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self._mm.close()
+            raise
+        if magic != DECK_PACK_MAGIC or version != DECK_PACK_VERSION:
+            self._mm.close()
+            raise ValueError(f'Not a deck pack: {path}')
+        name_start = DECK_PACK_HEADER.size
+        self.name = self._mm[name_start:name_start + name_len].decode('utf-8')
+        self.count = count
+        self._offsets = struct.Struct(f'<{count + 1}Q')
+        self._index_start = name_start + name_len
+        self._content_start = self._index_start + self._offsets.size
+        if self._content_start + content_len != len(self._mm):
+            self._mm.close()
+            raise ValueError(f'Truncated deck pack: {path}')
+
+    def iter_facts(self):
+        """Yield fact strings in deck order, decoding straight from the map"""
+        offsets = self._offsets.unpack_from(self._mm, self._index_start)
+        base = self._content_start
+        mm = self._mm
+        for i in range(self.count):
+            yield mm[base + offsets[i]:base + offsets[i + 1]].decode('utf-8')
+
+    def close(self):
+        self._mm.close()
+
+_deck_packs = {}  # pack path -> DeckPack
+
+def compile_deck_pack(json_path, pack_path):
+    """Compile a JSON deck into a binary deck pack"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not ('deckName' in data and 'facts' in data and isinstance(data['facts'], list) and data['facts']):
+        raise ValueError(f'Invalid deck format: {json_path}')
+
+    name = data['deckName'].encode('utf-8')
+    encoded = [str(fact).encode('utf-8') for fact in data['facts']]
+    offsets = [0]
+    for fact in encoded:
+        offsets.append(offsets[-1] + len(fact))
+
+    # Unique temp file so concurrent builds never publish each other's partial writes
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pack_path), suffix=DECK_PACK_EXT + '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(DECK_PACK_HEADER.pack(DECK_PACK_MAGIC, DECK_PACK_VERSION, len(name), len(encoded), offsets[-1]))
+            f.write(name)
+            f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+            f.writelines(encoded)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, pack_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def get_deck_pack(deck_file):
+    """Get the memory-mapped pack for a bundled deck, compiling it if missing or stale"""
+    base = os.path.splitext(os.path.basename(deck_file))[0]
+    json_path = os.path.join(DECKS_DIR, base + '.json')
+    pack_path = os.path.join(DECKS_DIR, base + DECK_PACK_EXT)
+
+    if os.path.exists(json_path) and (
+            not os.path.exists(pack_path) or os.path.getmtime(pack_path) < os.path.getmtime(json_path)):
+        compile_deck_pack(json_path, pack_path)
+    if not os.path.exists(pack_path):
+        return None
+
+    pack = _deck_packs.get(pack_path)
+    if pack and pack.mtime == os.path.getmtime(pack_path):
+        return pack
+    if pack:
+        pack.close()
+    pack = DeckPack(pack_path)
+    _deck_packs[pack_path] = pack
+    return pack
+
+@app.cli.command('build-decks')
+def build_decks():
+    """Compile every bundled JSON deck in decks/ into a deck pack"""
+    for filename in sorted(os.listdir(DECKS_DIR)):
+        if filename.endswith('.json'):
+            pack_path = os.path.join(DECKS_DIR, os.path.splitext(filename)[0] + DECK_PACK_EXT)
+            compile_deck_pack(os.path.join(DECKS_DIR, filename), pack_path)
+            click.echo(f'Built {os.path.basename(pack_path)}')
+
+_asset_manifest = {}  # original filename -> fingerprinted filename
+_asset_manifest_mtime = None
+
+@app.cli.command('build-assets')
+def build_assets():
+    """Write content-hashed, precompressed copies of static assets to static/dist"""
+    os.makedirs(ASSET_DIST_DIR, exist_ok=True)
+    manifest = {}
+    for filename in sorted(os.listdir(app.static_folder)):
+        stem, ext = os.path.splitext(filename)
+        if ext not in ASSET_EXTENSIONS:
+            continue
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            content = f.read()
+        hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+        with open(os.path.join(ASSET_DIST_DIR, hashed), 'wb') as f:
+            f.write(content)
+        with open(os.path.join(ASSET_DIST_DIR, hashed + '.gz'), 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        manifest[filename] = hashed
+        click.echo(f'Built {hashed}')
+
+    # Drop fingerprints left over from previous builds
+    current = set(manifest.values()) | {name + '.gz' for name in manifest.values()}
+    for filename in os.listdir(ASSET_DIST_DIR):
+        if filename != 'manifest.json' and filename not in current:
+            os.remove(os.path.join(ASSET_DIST_DIR, filename))
+
+    with open(ASSET_MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def get_asset_manifest():
+    """Load the asset manifest, reloading it after a rebuild; empty if assets have not been built"""
+    global _asset_manifest, _asset_manifest_mtime
+    try:
+        mtime = os.path.getmtime(ASSET_MANIFEST_PATH)
+    except OSError:
+        mtime = None
+    if mtime != _asset_manifest_mtime:
+        try:
+            with open(ASSET_MANIFEST_PATH, 'r') as f:
+                _asset_manifest = json.load(f)
+        except (OSError, ValueError):
+            _asset_manifest = {}
+        _asset_manifest_mtime = mtime
+    return _asset_manifest
+
+@app.template_global()
+def asset_url(filename):
+    """URL for a static asset, fingerprinted when a built copy exists"""
+    if app.debug:
+        # Serve live sources while developing so edits show up without a rebuild
+        return url_for('static', filename=filename)
+    hashed = get_asset_manifest().get(filename)
+    if hashed:
+        return url_for('hashed_asset', filename=hashed)
+    return url_for('static', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Serve a fingerprinted asset, preferring its precompressed gzip variant"""
+    use_gzip = (request.accept_encodings['gzip'] > 0
+                and os.path.isfile(os.path.join(ASSET_DIST_DIR, filename + '.gz')))
+    response = send_from_directory(
+        ASSET_DIST_DIR,
+        filename + '.gz' if use_gzip else filename,
+        mimetype=mimetypes.guess_type(filename)[0],
+    )
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def compress_json_response(response):
+    """Gzip JSON bodies above COMPRESS_MIN_SIZE when the client accepts it"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or not 200 <= response.status_code < 300 or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip'] <= 0:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 def get_user_progress():
     """Get or create user progress record"""
@@ -159,6 +395,24 @@ def initialize_achievements():
             db.session.add(achievement)
         db.session.commit()
 
+def migrate_schema():
+    """Add columns and indexes that existing tables predate; create_all never alters tables"""
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(
+                    f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}'
+                ))
+        db.session.commit()
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 # Spaced Repetition Functions
 def calculate_next_review(fact, quality):
     """
@@ -241,6 +495,178 @@ def select_fact_for_review(deck_id, mode='spaced'):
 
     return None
 
+
+def get_remaining_daily_caps(daily_caps):
+    """How many more facts each capped deck may show today"""
+    if not daily_caps:
+        return {}
+    reviewed_today = dict(db.session.query(Fact.deck_id, db.func.count(Fact.id)).filter(
+        Fact.deck_id.in_(daily_caps.keys()),
+        Fact.last_reviewed == date.today()
+    ).group_by(Fact.deck_id).all())
+    return {deck_id: max(0, cap - reviewed_today.get(deck_id, 0)) for deck_id, cap in daily_caps.items()}
+
+def iter_deck_due_facts(deck_id, page_size=50):
+    """Cursor over one deck's due facts, most overdue first, paged on the deck/date index"""
+    today = date.today()
+    last_date, last_id = None, 0
+    while True:
+        query = Fact.query.filter(Fact.deck_id == deck_id, Fact.next_review_date <= today)
+        if last_date is not None:
+            query = query.filter(db.or_(
+                Fact.next_review_date > last_date,
+                db.and_(Fact.next_review_date == last_date, Fact.id > last_id)
+            ))
+        page = query.order_by(Fact.next_review_date, Fact.id).limit(page_size).all()
+        yield from page
+        if len(page) < page_size:
+            return
+        last_date, last_id = page[-1].next_review_date, page[-1].id
+
+def get_global_due_queue(limit=20, weights=None, daily_caps=None):
+    """
+    Most overdue facts across every deck, followed by new facts.
+    weights: deck_id -> multiplier on overdue days (0 skips the deck)
+    daily_caps: deck_id -> max facts per deck per day
+    """
+    weights = weights or {}
+    remaining = get_remaining_daily_caps(daily_caps)
+    today = date.today()
+    queue = []
+
+    if not weights and not remaining:
+        # Unweighted and uncapped: one indexed scan gives the global order
+        queue = Fact.query.filter(Fact.next_review_date <= today).order_by(
+            Fact.next_review_date, Fact.id
+        ).limit(limit).all()
+    else:
+        # k-way merge: seed a heap with each deck's most overdue date, and
+        # only open a deck's cursor once it reaches the top of the heap.
+        # The seed is one index seek per deck on (deck_id, next_review_date).
+        excluded = [d for d, w in weights.items() if w <= 0] + [d for d, n in remaining.items() if n <= 0]
+        oldest_due = db.session.query(Fact.next_review_date).filter(
+            Fact.deck_id == Deck.id, Fact.next_review_date <= today
+        ).order_by(Fact.next_review_date).limit(1).correlate(Deck).scalar_subquery()
+        oldest = [(deck_id, oldest_date) for deck_id, oldest_date in db.session.query(Deck.id, oldest_due).filter(
+            Deck.id.notin_(excluded)
+        ).all() if oldest_date is not None]
+
+        def priority(deck_id, review_date):
+            return -((today - review_date).days + 1) * weights.get(deck_id, 1.0)
+
+        heap = [(priority(deck_id, oldest_date), deck_id, 0, None) for deck_id, oldest_date in oldest]
+        heapq.heapify(heap)
+        cursors = {}
+        while heap and len(queue) < limit:
+            _, deck_id, seq, fact = heapq.heappop(heap)
+            if fact is not None:
+                queue.append(fact)
+                if deck_id in remaining:
+                    remaining[deck_id] -= 1
+                    if remaining[deck_id] <= 0:
+                        continue
+            cursor = cursors.setdefault(deck_id, iter_deck_due_facts(deck_id))
+            following = next(cursor, None)
+            if following is not None:
+                heapq.heappush(heap, (priority(deck_id, following.next_review_date), deck_id, seq + 1, following))
+
+    if len(queue) < limit:
+        # Top up with new facts, applying each capped deck's remaining room in SQL
+        needed = limit - len(queue)
+        skipped = [d for d, w in weights.items() if w <= 0]
+        new_facts = Fact.query.filter(
+            Fact.next_review_date.is_(None), Fact.deck_id.notin_(skipped + list(remaining))
+        ).order_by(Fact.id).limit(needed).all()
+        for deck_id, room in remaining.items():
+            if room > 0 and deck_id not in skipped:
+                new_facts += Fact.query.filter(
+                    Fact.deck_id == deck_id, Fact.next_review_date.is_(None)
+                ).order_by(Fact.id).limit(min(room, needed)).all()
+        new_facts.sort(key=lambda f: f.id)
+        queue += new_facts[:needed]
+
+    return queue
+
+def select_fact_across_decks(weights=None, daily_caps=None):
+    """Select the next fact from the global due queue"""
+    # Random from top 5 most urgent, as in single-deck spaced mode
+    queue = get_global_due_queue(5, weights, daily_caps)
+    if queue:
+        return random.choice(queue)
+    return None
+
+
+def plan_session_facts(deck_id, mode, tags=None, fact_limit=None):
+    """Materialize a custom session's fact ids in one query"""
+    base = db.session.query(Fact.id).filter(Fact.deck_id == deck_id)
+    if tags:
+        # Whole-tag match against the comma-joined tags column
+        padded_tags = db.literal(',') + Fact.tags + ','
+        base = base.filter(db.or_(*[padded_tags.contains(f',{tag},', autoescape=True) for tag in tags]))
+
+    query = base
+    if mode == 'spaced':
+        # Due facts, most overdue first, then new facts
+        query = query.filter(
+            db.or_(Fact.next_review_date.is_(None), Fact.next_review_date <= date.today())
+        ).order_by(Fact.next_review_date.is_(None), Fact.next_review_date, Fact.id)
+    elif mode == 'cram':
+        # Hardest facts first
+        query = query.filter(Fact.ease_factor < 2.0).order_by(Fact.ease_factor, Fact.id)
+    elif mode == 'random':
+        query = query.order_by(db.func.random())
+    else:
+        query = query.order_by(Fact.id)
+
+    if fact_limit:
+        query = query.limit(fact_limit)
+    ids = [fact_id for fact_id, in query.all()]
+
+    if not ids and mode == 'cram':
+        # No hard facts yet, so cram from all facts, as select_fact_for_review does
+        query = base.order_by(db.func.random())
+        if fact_limit:
+            query = query.limit(fact_limit)
+        ids = [fact_id for fact_id, in query.all()]
+    return ids
+
+def store_session_plan(session, fact_ids):
+    """Bulk-insert the plan as packed chunks so each draw reads one small row"""
+    chunks = [{
+        'session_id': session.id,
+        'chunk': start // PLAN_CHUNK_SIZE,
+        'fact_ids': b''.join(PLANNED_FACT_ID.pack(fact_id) for fact_id in fact_ids[start:start + PLAN_CHUNK_SIZE])
+    } for start in range(0, len(fact_ids), PLAN_CHUNK_SIZE)]
+    if chunks:
+        db.session.execute(db.insert(SessionPlanChunk), chunks)
+    session.planned_count = len(fact_ids)
+    session.plan_position = 0
+
+def draw_planned_fact(session):
+    """Advance the session's plan cursor; None when the plan is used up"""
+    chunk = None
+    while session.plan_position < session.planned_count:
+        chunk_index, slot = divmod(session.plan_position, PLAN_CHUNK_SIZE)
+        if chunk is None or chunk.chunk != chunk_index:
+            chunk = db.session.get(SessionPlanChunk, (session.id, chunk_index))
+        fact_id, = PLANNED_FACT_ID.unpack_from(chunk.fact_ids, slot * PLANNED_FACT_ID.size)
+        session.plan_position += 1
+        fact = Fact.query.get(fact_id)
+        if fact:  # Skip facts deleted since the session was planned
+            return fact
+    return None
+
+def session_time_expired(session):
+    if not session.time_limit:
+        return False
+    return (datetime.utcnow() - session.start_time).total_seconds() >= session.time_limit * 60
+
+def get_current_session():
+    """Load the active study session into this request's db session"""
+    if current_session_id is None:
+        return None
+    return db.session.get(StudySession, current_session_id)
+
 @app.route('/')
 def index():
     return redirect(url_for('home'))
@@ -321,64 +747,76 @@ def export():
             return jsonify(data)
     return jsonify({'error': 'No deck loaded'})
 
-@app.route('/load_sample')
-def load_sample():
+def load_builtin_deck(deck_file):
+    """Make a bundled deck current, bulk-inserting its facts from the pack if needed"""
     global current_deck_id, viewed
-    sample_path = os.path.join(BASE_DIR, 'decks', 'Sample_Facts.json')
-    if os.path.exists(sample_path):
-        with open(sample_path, 'r') as f:
-            data = json.load(f)
-        
-        # Check if sample deck exists
-        existing_deck = Deck.query.filter_by(name=data['deckName']).first()
-        if existing_deck:
-            current_deck_id = existing_deck.id
-            viewed = set()
-            
-            # Update user progress for deck loading (even if already exists)
-            progress = get_user_progress()
-            progress.decks_loaded += 1
-            new_achievements = check_achievements(progress)
-            db.session.commit()
-            
-            return jsonify({
-                'status': 'success', 
-                'deckName': data['deckName'], 
-                'count': len(data['facts']),
-                'new_achievements': new_achievements,
-                'xp': progress.total_xp,
-                'streak': progress.current_streak
-            })
-        
-        # Create sample deck
-        new_deck = Deck(name=data['deckName'])
-        db.session.add(new_deck)
+    pack = get_deck_pack(deck_file)
+    if not pack:
+        return None
+
+    deck = Deck.query.filter_by(name=pack.name).first()
+    if not deck:
+        deck = Deck(name=pack.name)
+        db.session.add(deck)
+        db.session.flush()
+        db.session.execute(db.insert(Fact), [
+            {'content': content, 'deck_id': deck.id} for content in pack.iter_facts()
+        ])
         db.session.commit()
-        
-        for fact in data['facts']:
-            new_fact = Fact(content=fact, deck_id=new_deck.id)
-            db.session.add(new_fact)
-        db.session.commit()
-        
-        current_deck_id = new_deck.id
-        viewed = set()
-        
-        # Update user progress for deck loading
-        progress = get_user_progress()
-        progress.decks_loaded += 1
-        new_achievements = check_achievements(progress)
-        db.session.commit()
-        
-        return jsonify({
-            'status': 'success', 
-            'deckName': data['deckName'], 
-            'count': len(data['facts']),
-            'new_achievements': new_achievements,
-            'xp': progress.total_xp,
-            'streak': progress.current_streak
-        })
+
+    current_deck_id = deck.id
+    viewed = set()
+
+    # Update user progress for deck loading (even if already exists)
+    progress = get_user_progress()
+    progress.decks_loaded += 1
+    new_achievements = check_achievements(progress)
+    db.session.commit()
+
+    return jsonify({
+        'status': 'success',
+        'deckName': pack.name,
+        'count': pack.count,
+        'new_achievements': new_achievements,
+        'xp': progress.total_xp,
+        'streak': progress.current_streak
+    })
+
+@app.route('/load_sample')
+def load_sample():
+    try:
+        response = load_builtin_deck('Sample_Facts.json')
+    except (ValueError, OSError, struct.error) as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+    if response:
+        return response
     return jsonify({'status': 'error', 'message': 'Sample deck not found'})
 
+@app.route('/list_builtin_decks')
+def list_builtin_decks():
+    """List bundled decks from their pack headers"""
+    bases = sorted({os.path.splitext(filename)[0] for filename in os.listdir(DECKS_DIR)
+                    if filename.endswith('.json') or filename.endswith(DECK_PACK_EXT)})
+    decks = []
+    for base in bases:
+        try:
+            pack = get_deck_pack(base)
+        except (ValueError, OSError, struct.error):
+            continue
+        if pack:
+            decks.append({'file': base, 'deckName': pack.name, 'count': pack.count})
+    return jsonify(decks)
+
+@app.route('/load_builtin_deck/<deck_file>')
+def load_builtin_deck_route(deck_file):
+    try:
+        response = load_builtin_deck(deck_file)
+    except (ValueError, OSError, struct.error) as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+    if response:
+        return response
+    return jsonify({'status': 'error', 'message': 'Built-in deck not found'})
+
 @app.route('/get_status')
 def get_status():
     if current_deck_id:
@@ -430,12 +868,30 @@ def delete_deck(deck_name):
 
 @app.route('/next_fact')
 def next_fact():
-    global viewed, current_session
-    if not current_deck_id:
+    global viewed, current_session_id
+    current_session = get_current_session()
+    if current_session and current_session.planned_count is not None:
+        # Planned custom session: draw from the plan until it or the time runs out
+        fact = None if session_time_expired(current_session) else draw_planned_fact(current_session)
+        if not fact:
+            current_session.end_time = db.func.current_timestamp()
+            current_session.total_time = int((datetime.utcnow() - current_session.start_time).total_seconds())
+            db.session.commit()
+            session_data = {
+                'session_id': current_session.id,
+                'facts_studied': current_session.facts_studied,
+                'correct_answers': current_session.correct_answers,
+                'accuracy': round((current_session.correct_answers / current_session.facts_studied * 100), 1) if current_session.facts_studied > 0 else 0
+            }
+            current_session_id = None
+            return jsonify({'fact': 'Session complete', 'session_complete': True, 'session': session_data})
+    elif all_decks_mode:
+        fact = select_fact_across_decks(deck_weights, deck_daily_caps)
+    elif not current_deck_id:
         return jsonify({'fact': 'No deck loaded'})
-
-    # Select fact based on current study mode
-    fact = select_fact_for_review(current_deck_id, current_study_mode)
+    else:
+        # Select fact based on current study mode
+        fact = select_fact_for_review(current_deck_id, current_study_mode)
     if not fact:
         return jsonify({'fact': 'No facts available'})
 
@@ -444,7 +900,10 @@ def next_fact():
 
     # Create or update study session
     if not current_session:
-        current_session = StudySession(mode=current_study_mode, deck_id=current_deck_id)
+        # All-decks sessions are stored under the first fact's deck but kept out of per-deck stats
+        session_mode = ALL_DECKS_SESSION_MODE if all_decks_mode else current_study_mode
+        current_session = StudySession(mode=session_mode, deck_id=fact.deck_id if all_decks_mode else current_deck_id,
+                                       facts_studied=0, correct_answers=0)
         db.session.add(current_session)
     current_session.facts_studied += 1
 
@@ -454,10 +913,13 @@ def next_fact():
     update_streak(progress)
     new_achievements = check_achievements(progress)
     db.session.commit()
+    current_session_id = current_session.id
 
     return jsonify({
         'fact': fact.content,
         'fact_id': fact.id,
+        'deck_id': fact.deck_id,
+        'all_decks': all_decks_mode,
         'new_achievements': new_achievements,
         'xp': progress.total_xp,
         'streak': progress.current_streak,
@@ -469,17 +931,75 @@ def next_fact():
 
 @app.route('/set_study_mode/<mode>')
 def set_study_mode(mode):
-    global current_study_mode, current_session
-    if mode in ['spaced', 'review', 'cram', 'random']:
+    global current_study_mode, current_session_id
+    if mode in STUDY_MODES:
         current_study_mode = mode
         # End current session if exists
+        current_session = get_current_session()
         if current_session:
             current_session.end_time = db.func.current_timestamp()
             db.session.commit()
-        current_session = None  # Will be created on next fact
+        current_session_id = None  # Will be created on next fact
         return jsonify({'status': 'success', 'mode': mode})
     return jsonify({'status': 'error', 'message': 'Invalid mode'})
 
+@app.route('/set_all_decks_mode', methods=['POST'])
+def set_all_decks_mode():
+    """Study due facts across every deck, with optional per-deck weights and daily caps"""
+    global all_decks_mode, deck_weights, deck_daily_caps, current_session_id
+    data = request.get_json() or {}
+    weights = data.get('weights', {})  # deck name -> weight
+    daily_caps = data.get('daily_caps', {})  # deck name -> facts per day
+    enabled = data.get('enabled', True)
+    if not isinstance(weights, dict) or not isinstance(daily_caps, dict):
+        return jsonify({'status': 'error', 'message': 'Weights and daily caps must map deck names to numbers'})
+    if not isinstance(enabled, bool):
+        return jsonify({'status': 'error', 'message': 'enabled must be true or false'})
+    if not all(isinstance(w, (int, float)) and not isinstance(w, bool) and math.isfinite(w) and w >= 0
+               for w in weights.values()):
+        return jsonify({'status': 'error', 'message': 'Weights must be finite, non-negative numbers'})
+    if not all(isinstance(n, int) and not isinstance(n, bool) and n >= 0 for n in daily_caps.values()):
+        return jsonify({'status': 'error', 'message': 'Daily caps must be non-negative whole numbers'})
+
+    names = set(weights) | set(daily_caps)
+    deck_ids = {deck.name: deck.id for deck in Deck.query.filter(Deck.name.in_(names)).all()} if names else {}
+    unknown = sorted(names - set(deck_ids))
+    if unknown:
+        return jsonify({'status': 'error', 'message': f'Deck not found: {", ".join(unknown)}'})
+
+    deck_weights = {deck_ids[name]: float(w) for name, w in weights.items()}
+    deck_daily_caps = {deck_ids[name]: n for name, n in daily_caps.items()}
+    all_decks_mode = enabled
+
+    # End current session if exists
+    current_session = get_current_session()
+    if current_session:
+        current_session.end_time = db.func.current_timestamp()
+        db.session.commit()
+    current_session_id = None  # Will be created on next fact
+
+    return jsonify({
+        'status': 'success',
+        'enabled': all_decks_mode,
+        'weights': weights,
+        'daily_caps': daily_caps
+    })
+
+@app.route('/get_due_queue')
+def get_due_queue():
+    """Preview the most overdue facts across every deck"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 500))
+    queue = get_global_due_queue(limit, deck_weights, deck_daily_caps)
+    deck_names = dict(db.session.query(Deck.id, Deck.name).filter(
+        Deck.id.in_({fact.deck_id for fact in queue})
+    ).all()) if queue else {}
+    return jsonify([{
+        'id': f.id,
+        'content': f.content,
+        'deckName': deck_names.get(f.deck_id),
+        'next_review': f.next_review_date.isoformat() if f.next_review_date else None
+    } for f in queue])
+
 @app.route('/submit_answer/<int:fact_id>/<int:quality>')
 def submit_answer(fact_id, quality):
     """Submit answer quality for spaced repetition"""
@@ -494,7 +1014,7 @@ def submit_answer(fact_id, quality):
     calculate_next_review(fact, quality)
 
     # Update session stats
-    global current_session
+    current_session = get_current_session()
     if current_session and quality >= 3:  # Consider 3+ as correct
         current_session.correct_answers += 1
 
@@ -525,7 +1045,9 @@ def get_study_stats():
     avg_ease = sum(ease_factors) / len(ease_factors) if ease_factors else 2.5
 
     # Study sessions
-    sessions = StudySession.query.filter_by(deck_id=current_deck_id).order_by(StudySession.start_time.desc()).limit(10).all()
+    sessions = StudySession.query.filter_by(deck_id=current_deck_id).filter(
+        StudySession.mode != ALL_DECKS_SESSION_MODE
+    ).order_by(StudySession.start_time.desc()).limit(10).all()
 
     return jsonify({
         'total_facts': total_facts,
@@ -673,26 +1195,47 @@ def get_facts_by_tag(tag):
 @app.route('/create_custom_session', methods=['POST'])
 def create_custom_session():
     """Create a custom study session with specific parameters"""
-    global current_session
+    global current_session_id
 
     if not current_deck_id:
         return jsonify({'status': 'error', 'message': 'No deck loaded'})
 
-    data = request.get_json()
+    data = request.get_json() or {}
     mode = data.get('mode', 'spaced')
     fact_limit = data.get('fact_limit', None)  # Limit number of facts
     time_limit = data.get('time_limit', None)  # Time limit in minutes
     tags = data.get('tags', [])  # Filter by tags
 
+    if mode not in STUDY_MODES:
+        return jsonify({'status': 'error', 'message': 'Invalid mode'})
+    # Limits are optional; when given they must be positive whole numbers
+    for limit in (fact_limit, time_limit):
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+            return jsonify({'status': 'error', 'message': 'Fact and time limits must be positive whole numbers'})
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return jsonify({'status': 'error', 'message': 'Tags must be a list of strings'})
+    tags = [tag.strip() for tag in tags if tag.strip()]
+
     # End current session if exists
+    current_session = get_current_session()
     if current_session:
         current_session.end_time = db.func.current_timestamp()
         db.session.commit()
 
-    # Create new custom session
-    current_session = StudySession(mode=mode, deck_id=current_deck_id)
+    # Create new custom session with its planned facts
+    planned_fact_ids = plan_session_facts(current_deck_id, mode, tags, fact_limit)
+    current_session = StudySession(
+        mode=mode,
+        deck_id=current_deck_id,
+        start_time=datetime.utcnow(),
+        fact_limit=fact_limit,
+        time_limit=time_limit
+    )
     db.session.add(current_session)
+    db.session.flush()
+    store_session_plan(current_session, planned_fact_ids)
     db.session.commit()
+    current_session_id = current_session.id
 
     return jsonify({
         'status': 'success',
@@ -700,12 +1243,14 @@ def create_custom_session():
         'mode': mode,
         'fact_limit': fact_limit,
         'time_limit': time_limit,
-        'tags': tags
+        'tags': tags,
+        'planned_facts': current_session.planned_count
     })
 
 @app.route('/get_session_progress')
 def get_session_progress():
     """Get current session progress"""
+    current_session = get_current_session()
     if not current_session:
         return jsonify({'error': 'No active session'})
 
@@ -715,13 +1260,16 @@ def get_session_progress():
         'facts_studied': current_session.facts_studied,
         'correct_answers': current_session.correct_answers,
         'start_time': current_session.start_time.isoformat(),
+        'planned_facts': current_session.planned_count,
+        'remaining_facts': current_session.planned_count - current_session.plan_position if current_session.planned_count is not None else None,
         'accuracy': round((current_session.correct_answers / current_session.facts_studied * 100), 1) if current_session.facts_studied > 0 else 0
     })
 
 @app.route('/end_session')
 def end_session():
     """End the current study session"""
-    global current_session
+    global current_session_id
+    current_session = get_current_session()
     if current_session:
         current_session.end_time = db.func.current_timestamp()
         db.session.commit()
@@ -731,12 +1279,13 @@ def end_session():
             'correct_answers': current_session.correct_answers,
             'accuracy': round((current_session.correct_answers / current_session.facts_studied * 100), 1) if current_session.facts_studied > 0 else 0
         }
-        current_session = None
+        current_session_id = None
         return jsonify({'status': 'success', 'session': session_data})
     return jsonify({'status': 'error', 'message': 'No active session'})
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        migrate_schema()
         initialize_achievements()
     app.run(debug=True)
\ No newline at end of file